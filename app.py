@@ -10,15 +10,23 @@ Features:
 - Unique player IDs allow same username for different players
 - List conversion with sorting for dual leaderboard views
 - Strategic AI with player choice memory and pattern recognition
-- Secure file-based persistence with SHA-256 checksums
+- File-based persistence with CRC32 (optionally SHA-256) checksums
+- Append-only write-ahead log with periodic background compaction
 """
 
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, Response, request, render_template
 import random
+import bisect
 import json
 import hashlib
+import zlib
 import os
+import shutil
 import uuid
+import time
+import queue
+import atexit
+import threading
 from datetime import datetime
 
 app = Flask(__name__)
@@ -28,16 +36,51 @@ app = Flask(__name__)
 # =============================================================================
 DATA_FILE = "leaderboard_data.json"
 BACKUP_FILE = "leaderboard_data.backup.json"
+WAL_FILE = "leaderboard.wal"
+
+# Write-ahead log compaction (debounced): the WAL is folded into DATA_FILE
+# once no changes have arrived for COMPACT_IDLE_SECONDS, when a game ends,
+# or once COMPACT_MAX_ENTRIES lines pile up
+COMPACT_IDLE_SECONDS = 5
+COMPACT_MAX_ENTRIES = 100
+WAL_FSYNC = False
+
+# Snapshots always carry a CRC32 of the leaderboard bytes, which is enough
+# to catch corruption. Set to True to also store and verify SHA-256.
+SNAPSHOT_SHA256 = False
+
+# Guards the WAL and snapshot files against concurrent writers
+PERSIST_LOCK = threading.RLock()
+WAL_ENTRIES = 0
+LAST_MUTATION = 0.0
+FLUSH_REQUESTED = False
+# Set when a WAL append fails: the dropped records are only on disk once
+# the next snapshot is written
+SNAPSHOT_DIRTY = False
+
+# Guards LEADERBOARD, the sort indexes and GAME_STATE. Handlers do their
+# reads and updates under it and serialize the response after releasing it.
+# Lock order is PERSIST_LOCK then STATE_LOCK; never compact while holding
+# STATE_LOCK.
+STATE_LOCK = threading.RLock()
+
+# Serialized WAL records waiting for the persistence thread. Requests only
+# enqueue; the thread drains everything pending into a single append.
+WRITE_Q = queue.Queue()
+_WAL_EVENT = threading.Event()
+
+# Raw O_APPEND descriptor for the WAL, opened on first append
+WAL_FD = None
 
 # =============================================================================
 # CENTRAL DATA STORE: Dictionary (LEADERBOARD)
 # =============================================================================
 # Structure: Global Python Dictionary serving as single source of truth
 # Key: Unique player ID (UUID string)
-# Value: Nested dictionary with player name and cumulative statistics
+# Value: PlayerStats record with player name and cumulative statistics
 # Purpose: O(1) average time complexity for searching and updating
 # 
-# Structure with unique IDs and AI pattern tracking:
+# Structure with unique IDs and AI pattern tracking (as saved to JSON):
 # {
 #     "uuid-string-here": {
 #         "id": "uuid-string-here",
@@ -47,21 +90,49 @@ BACKUP_FILE = "leaderboard_data.backup.json"
 #         "games_played": int,
 #         "is_cpu": bool,
 #         "created_at": "ISO timestamp",
-#         "choice_history": {             # Frequency counts for AI
-#             "rock": int,
-#             "paper": int,
-#             "scissors": int
-#         },
-#         "move_sequence": [],            # Last N moves for pattern detection
-#         "pattern_history": {            # What move follows each 2-move pattern
-#             "('rock','rock')": {"rock": 0, "paper": 0, "scissors": 0},
-#             ...
-#         }
+#         "choice_history": [0, 0, 0],    # Frequency counts for AI: [rock, paper, scissors]
+#         "total_choices": int,           # Running sum of choice_history
+#         "move_sequence": [-1] * 10,     # Ring buffer of the last 10 move indices (-1 = empty)
+#         "move_head": int,               # Next slot to write in move_sequence
+#         "last_pattern": int,            # Last 2 moves packed (see pattern_key)
+#         "pattern_history": [            # What move follows each 2-move pattern
+#             [0, 0, 0],                  # Index: packed pattern 0..8 (see pattern_key)
+#             ...                         # Value: [rock, paper, scissors] counts
+#         ]
 #     }
 # }
 # =============================================================================
 LEADERBOARD = {}
 
+# Canonical JSON of each record as of its last WAL write, as
+# (record, bytes) pairs. Snapshots reuse the bytes while the record object
+# is still the one in LEADERBOARD, so only changed players are re-encoded.
+RECORD_JSON = {}
+
+# =============================================================================
+# SORT INDEXES: Lists kept in sorted order as LEADERBOARD changes
+# =============================================================================
+# SCORE_INDEX entries: (-score, lowercased name, created_at, player ID)
+# NAME_INDEX entries:  (lowercased name, created_at, player ID)
+# Updated with binary search on every write, so the leaderboard endpoint
+# never has to re-sort the whole player list. Equal names and scores stay
+# in registration order; the ID only makes every entry unique.
+# =============================================================================
+SCORE_INDEX = []
+NAME_INDEX = []
+
+# Serialized /api/leaderboard response, reused until LEADERBOARD_VERSION
+# changes. The version is bumped on every write path. The cache is a
+# (version, body, etag) tuple replaced in one assignment, so lock-free
+# readers never see a version paired with another version's body.
+LEADERBOARD_VERSION = 0
+_lb_cache = (-1, None, "")
+
+# Encoded leaderboard row per player, as (record, bytes) pairs. Like
+# RECORD_JSON, an entry is dropped by wal_log_player whenever the record
+# changes, and only used while the record object is still in LEADERBOARD.
+_lb_rows = {}
+
 # CPU's fixed ID (singleton - only one CPU player)
 CPU_ID = "cpu-00000000-0000-0000-0000-000000000000"
 
@@ -82,6 +153,12 @@ GAME_STATE = {
     "game_history": []
 }
 
+# Bumped on every GAME_STATE change; /api/game/state uses it in its ETag.
+# The counter restarts at 0 with the process, so ETags also carry a random
+# per-process token: a tag from a previous run must never match.
+GAME_STATE_VERSION = 0
+GAME_STATE_TOKEN = uuid.uuid4().hex[:8]
+
 # Rock-Paper-Scissors game rules
 RPS_RULES = {
     "rock": {"beats": "scissors", "loses_to": "paper"},
@@ -96,6 +173,101 @@ COUNTER_MOVES = {
     "scissors": "rock"
 }
 
+# Move indices for compact per-move count arrays: [rock, paper, scissors]
+MOVES = ["rock", "paper", "scissors"]
+MOVE_IDX = {"rock": 0, "paper": 1, "scissors": 2}
+
+# RPS_RULES and COUNTER_MOVES by move index, for the round and AI paths:
+# BEATS_IDX[i] is the move i beats, COUNTER_IDX[i] the move that beats i
+BEATS_IDX = tuple(MOVE_IDX[RPS_RULES[move]["beats"]] for move in MOVES)
+COUNTER_IDX = tuple(MOVE_IDX[COUNTER_MOVES[move]] for move in MOVES)
+
+# Round result for every (player 1 move, player 2 move) pair, indexed by
+# the packed pair idx1 * 3 + idx2 (same packing as pattern_key)
+ROUND_RESULTS = tuple(
+    "tie" if idx1 == idx2 else "player1" if BEATS_IDX[idx1] == idx2 else "player2"
+    for idx1 in range(3) for idx2 in range(3)
+)
+
+# Number of recent moves kept per player in the move_sequence ring buffer
+MOVE_SEQUENCE_LENGTH = 10
+
+# AI thresholds: moves needed before predicting, samples needed before
+# trusting a 2-move pattern, and the confidence each strategy must exceed
+MIN_HISTORY_THRESHOLD = 5
+MIN_PATTERN_THRESHOLD = 3
+PATTERN_CONFIDENCE = 0.5
+FREQUENCY_CONFIDENCE = 0.4
+
+# Include display-only per-move percentages (player_tendencies) in CPU
+# choice responses. The game UI does not show them; per-player percentages
+# are available from /api/player/<id>/stats.
+CPU_VERBOSE_ANALYSIS = False
+
+# Analysis served for opponent IDs that are not on the leaderboard
+UNKNOWN_OPPONENT_ANALYSIS = {
+    "strategy": "random",
+    "counter": None,
+    "cum_weights": None,
+    "details": {"confidence": 0, "analysis": "Unknown player ID"}
+}
+
+# Memoized opponent analysis for the AI, keyed by player ID:
+# {player_id: ((move_head, total_choices), analysis)}
+AI_CACHE = {}
+
+
+# =============================================================================
+# PLAYER RECORDS
+# =============================================================================
+class PlayerStats:
+    """
+    One player's entry in LEADERBOARD.
+    
+    __slots__ gives each record a fixed set of attributes instead of a
+    per-instance dict, so records take less memory and attribute reads
+    skip the string-key hash lookup. Records are converted to and from
+    plain dicts only at the JSON boundaries (snapshot, WAL, API responses).
+    
+    FIELDS are the serialized attributes. name_lower is derived from name
+    once at construction, so the sort indexes never re-lowercase names.
+    """
+    FIELDS = (
+        "id", "name", "score", "games_won", "games_played", "is_cpu",
+        "created_at", "choice_history", "total_choices", "move_sequence",
+        "move_head", "last_pattern", "pattern_history"
+    )
+    __slots__ = FIELDS + ("name_lower",)
+    
+    def __init__(self, id, name, score=0, games_won=0, games_played=0,
+                 is_cpu=False, created_at=None, choice_history=None,
+                 total_choices=0, move_sequence=None, move_head=0,
+                 last_pattern=0, pattern_history=None):
+        self.id = id
+        self.name = name
+        self.name_lower = name.lower()
+        self.score = score
+        self.games_won = games_won
+        self.games_played = games_played
+        self.is_cpu = is_cpu
+        self.created_at = created_at or datetime.now().isoformat()
+        self.choice_history = choice_history if choice_history is not None else [0, 0, 0]
+        self.total_choices = total_choices
+        self.move_sequence = move_sequence if move_sequence is not None else [-1] * MOVE_SEQUENCE_LENGTH
+        self.move_head = move_head
+        self.last_pattern = last_pattern
+        self.pattern_history = pattern_history if pattern_history is not None else empty_patterns()
+    
+    def to_dict(self):
+        """Plain dict form used for JSON serialization."""
+        return {field: getattr(self, field) for field in PlayerStats.FIELDS}
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Build a record from its JSON form, migrating older layouts first."""
+        migrate_player(data)
+        return cls(**{field: data[field] for field in cls.FIELDS if field in data})
+
 
 # =============================================================================
 # HELPER FUNCTIONS
@@ -113,47 +285,364 @@ def get_player_by_id(player_id):
 def get_player_name(player_id):
     """Get player's display name by ID."""
     player = LEADERBOARD.get(player_id)
-    return player["name"] if player else None
+    return player.name if player else None
+
+
+def encode_json(obj):
+    """Serialize an API payload to compact JSON bytes."""
+    return json.dumps(obj, separators=(',', ':'), default=PlayerStats.to_dict).encode()
+
+
+def json_response(obj, status=200):
+    """
+    Build a JSON response without going through jsonify.
+    
+    jsonify pretty-prints and sorts keys when the app runs in debug mode;
+    API payloads only need compact bytes.
+    """
+    return Response(encode_json(obj), status=status, mimetype='application/json')
+
+
+def not_modified(etag):
+    """304 Not Modified response that still carries the matched ETag."""
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def read_json_body():
+    """
+    Parse the request body as a JSON object, or {} if it is missing/invalid.
+    
+    The raw bytes go straight to json.loads, skipping get_json's mimetype
+    check and JSON provider dispatch. A bad body then falls through to
+    each endpoint's own "field is required" error instead of a 500.
+    """
+    try:
+        data = json.loads(request.get_data(cache=False))
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+# play_round responses always have the same shape, so they are rendered
+# from a byte template rather than through the general-purpose encoder
+ROUND_RESPONSE_TEMPLATE = (
+    b'{"round":{"round":%d,"player1_choice":"%s","player2_choice":"%s","result":"%s"},'
+    b'"game_state":{"current_round":%d,"player1_round_wins":%d,"player2_round_wins":%d,'
+    b'"game_active":%s},"game_over":%s,"game_winner":%s}'
+)
+
+
+def encode_round_response(round_number, choice1, choice2, result,
+                          player1_wins, player2_wins, game_active, game_over,
+                          winner_id, winner_name):
+    """
+    Render a play_round response body from ROUND_RESPONSE_TEMPLATE.
+    
+    Choices and result are validated move names and fixed result strings,
+    so they need no escaping; the winner (a user-chosen name) still goes
+    through the JSON encoder.
+    """
+    winner = encode_json({"id": winner_id, "name": winner_name}) if winner_id else b'null'
+    return ROUND_RESPONSE_TEMPLATE % (
+        round_number, choice1.encode(), choice2.encode(), result.encode(),
+        round_number, player1_wins, player2_wins,
+        b'true' if game_active else b'false',
+        b'true' if game_over else b'false',
+        winner
+    )
+
+
+def pattern_key(move1, move2):
+    """Pack a 2-move pattern into a small int key (0-8)."""
+    return MOVE_IDX[move1] * 3 + MOVE_IDX[move2]
+
+
+def has_two_moves(player):
+    """True once the move_sequence ring buffer holds at least 2 moves."""
+    # move_head - 2 is at least -2, which Python indexing wraps for us
+    return player.move_sequence[player.move_head - 2] >= 0
+
+
+def round_record(entry):
+    """Expand a (round, idx1, idx2) game_history entry into its JSON form."""
+    round_number, idx1, idx2 = entry
+    return {
+        "round": round_number,
+        "player1_choice": MOVES[idx1],
+        "player2_choice": MOVES[idx2],
+        "result": ROUND_RESULTS[idx1 * 3 + idx2]
+    }
+
+
+def empty_patterns():
+    """Fresh pattern table: one [rock, paper, scissors] counter per pattern key."""
+    return [[0, 0, 0] for _ in range(9)]
+
+
+# =============================================================================
+# SORT INDEX FUNCTIONS
+# =============================================================================
+def score_index_key(player_id):
+    """Sort key for SCORE_INDEX: highest score first, then by name."""
+    player = LEADERBOARD[player_id]
+    return (-player.score, player.name_lower, player.created_at, player_id)
+
+
+def name_index_key(player_id):
+    """Sort key for NAME_INDEX: by name, then by registration time."""
+    player = LEADERBOARD[player_id]
+    return (player.name_lower, player.created_at, player_id)
+
+
+def index_player(player_id):
+    """Insert a newly registered player into both sort indexes."""
+    bisect.insort(SCORE_INDEX, score_index_key(player_id))
+    bisect.insort(NAME_INDEX, name_index_key(player_id))
+
+
+def rebuild_indexes():
+    """Rebuild both sort indexes from scratch (after load or reset)."""
+    SCORE_INDEX[:] = sorted(score_index_key(pid) for pid in LEADERBOARD)
+    NAME_INDEX[:] = sorted(name_index_key(pid) for pid in LEADERBOARD)
+
+
+def add_score(player_id, points):
+    """Add points to a player's score and reposition them in SCORE_INDEX."""
+    old_key = score_index_key(player_id)
+    pos = bisect.bisect_left(SCORE_INDEX, old_key)
+    if pos < len(SCORE_INDEX) and SCORE_INDEX[pos] == old_key:
+        del SCORE_INDEX[pos]
+    LEADERBOARD[player_id].score += points
+    bisect.insort(SCORE_INDEX, score_index_key(player_id))
+
+
+def mark_leaderboard_changed():
+    """Invalidate the cached /api/leaderboard response."""
+    global LEADERBOARD_VERSION
+    LEADERBOARD_VERSION += 1
+
+
+def mark_game_state_changed():
+    """Invalidate /api/game/state ETags handed out for the old state."""
+    global GAME_STATE_VERSION
+    GAME_STATE_VERSION += 1
 
 
 # =============================================================================
 # DATA PERSISTENCE FUNCTIONS
 # =============================================================================
-def calculate_checksum(data):
-    """Calculate SHA-256 checksum for data integrity verification."""
-    json_str = json.dumps(data, sort_keys=True)
-    return hashlib.sha256(json_str.encode()).hexdigest()
+def encode_record(record):
+    """Serialize one player record to canonical (sorted, compact) JSON bytes."""
+    return json.dumps(record, sort_keys=True, separators=(',', ':'),
+                      default=PlayerStats.to_dict).encode()
 
 
-def save_leaderboard():
-    """Save LEADERBOARD to JSON file with checksum and backup."""
-    global LEADERBOARD
+def iter_leaderboard_chunks(data, cache=None):
+    """
+    Yield leaderboard data as canonical (sorted, compact) JSON, one player
+    per chunk.
+    
+    Joining the chunks gives exactly json.dumps(data, sort_keys=True) with
+    compact separators, but each record goes through the C encoder on its
+    own so a save never builds the whole file in memory. With a cache
+    (RECORD_JSON), records that have not changed are not re-encoded.
+    """
+    yield b'{'
+    for i, player_id in enumerate(sorted(data)):
+        record = data[player_id]
+        cached = cache.get(player_id) if cache is not None else None
+        if cached and cached[0] is record:
+            encoded = cached[1]
+        else:
+            encoded = encode_record(record)
+            if cache is not None:
+                cache[player_id] = (record, encoded)
+        yield (b',' if i else b'') + json.dumps(player_id).encode() + b':' + encoded
+    yield b'}'
+
+
+def serialize_leaderboard(data):
+    """Serialize leaderboard data to canonical (sorted, compact) JSON bytes."""
+    return b''.join(iter_leaderboard_chunks(data))
+
+
+def calculate_checksum(payload):
+    """
+    Calculate SHA-256 checksum of already-serialized leaderboard bytes.
     
-    if os.path.exists(DATA_FILE):
+    hashlib hands the bytes straight to OpenSSL, which uses the SHA
+    extensions (SHA-NI) where the CPU supports them.
+    """
+    h = hashlib.sha256()
+    h.update(payload)
+    return h.hexdigest()
+
+
+def verify_integrity_sha256(data, expected):
+    """Check a loaded leaderboard against its stored SHA-256 checksum."""
+    if calculate_checksum(serialize_leaderboard(data)) == expected:
+        return True
+    # Files written before compact serialization used default separators
+    legacy = json.dumps(data, sort_keys=True).encode()
+    return calculate_checksum(legacy) == expected
+
+
+def verify_snapshot(save_data, data):
+    """
+    Check a loaded leaderboard against every checksum its file carries.
+    
+    The CRC32 fast check runs first; SHA-256 is verified when present
+    (older files, or snapshots written with SNAPSHOT_SHA256 enabled).
+    """
+    if "crc32" in save_data:
+        crc = zlib.crc32(serialize_leaderboard(data))
+        if f"{crc:08x}" != save_data["crc32"]:
+            return False
+    if "checksum" in save_data:
+        return verify_integrity_sha256(data, save_data["checksum"])
+    return True
+
+
+def backup_data_file():
+    """
+    Keep the current DATA_FILE as BACKUP_FILE without copying its contents.
+    
+    A hard link gives the existing file a second name; the new snapshot is
+    then renamed over DATA_FILE, leaving the backup pointing at the old data.
+    """
+    if not os.path.exists(DATA_FILE):
+        return
+    
+    try:
+        if os.path.exists(BACKUP_FILE):
+            os.remove(BACKUP_FILE)
+        os.link(DATA_FILE, BACKUP_FILE)
+    except OSError:
+        # Filesystem without hard links: fall back to a plain copy
         try:
-            with open(DATA_FILE, 'r') as f:
-                backup_data = f.read()
-            with open(BACKUP_FILE, 'w') as f:
-                f.write(backup_data)
+            shutil.copyfile(DATA_FILE, BACKUP_FILE)
         except Exception as e:
             print(f"Backup failed: {e}")
+
+
+def save_leaderboard():
+    """
+    Save LEADERBOARD to JSON file with checksum and backup.
     
-    save_data = {
+    The snapshot is written to a temporary file and atomically renamed over
+    DATA_FILE, so a crash mid-write never leaves a truncated data file.
+    """
+    global LEADERBOARD
+    tmp_file = DATA_FILE + ".tmp"
+    
+    # The checksums trail the data they cover, so the leaderboard is written
+    # in a single pass
+    header = json.dumps({
         "version": "2.0",
-        "last_updated": datetime.now().isoformat(),
-        "leaderboard": LEADERBOARD,
-        "checksum": calculate_checksum(LEADERBOARD)
-    }
+        "last_updated": datetime.now().isoformat()
+    }, separators=(',', ':')).encode()
+    crc = 0
+    h = hashlib.sha256() if SNAPSHOT_SHA256 else None
     
     try:
-        with open(DATA_FILE, 'w') as f:
-            json.dump(save_data, f, indent=2)
+        # Records must not change while they are encoded, but the chunks are
+        # immutable bytes, so checksumming and file I/O happen after the
+        # lock is released and never block request handlers
+        with STATE_LOCK:
+            chunks = list(iter_leaderboard_chunks(LEADERBOARD, RECORD_JSON))
+        
+        with open(tmp_file, 'wb') as f:
+            f.write(header[:-1] + b',"leaderboard":')
+            for chunk in chunks:
+                crc = zlib.crc32(chunk, crc)
+                if h:
+                    h.update(chunk)
+                f.write(chunk)
+            f.write(b',"crc32":"' + f"{crc:08x}".encode() + b'"')
+            if h:
+                f.write(b',"checksum":"' + h.hexdigest().encode() + b'"')
+            f.write(b'}')
+            # The WAL is truncated once this returns, so the snapshot must
+            # be on disk before it is renamed into place
+            f.flush()
+            os.fsync(f.fileno())
+        backup_data_file()
+        os.replace(tmp_file, DATA_FILE)
         return True
     except Exception as e:
         print(f"Save failed: {e}")
         return False
 
 
+def migrate_player(player_data):
+    """
+    Normalize a player record loaded from JSON.
+    
+    pattern_history used to be a dict, keyed either by stringified packed
+    ints or, in older files, by stringified tuples with per-move dicts, e.g.
+    "('rock', 'paper')": {"rock": 1, "paper": 0, "scissors": 2}.
+    Both become the 9-slot table of [rock, paper, scissors] lists.
+    Older choice_history dicts become lists with a running total,
+    last_pattern is derived from move_sequence when missing, and a
+    move_sequence of move names becomes the ring buffer of move indices.
+    
+    move_head was the last field added, so records that carry it are
+    already in the current layout and skip every check below.
+    """
+    if "move_head" in player_data:
+        return player_data
+    
+    history = player_data.get("choice_history")
+    if isinstance(history, dict):
+        history = [history.get(move, 0) for move in MOVES]
+        player_data["choice_history"] = history
+    if history is not None and "total_choices" not in player_data:
+        player_data["total_choices"] = sum(history)
+    
+    move_sequence = player_data.get("move_sequence")
+    if move_sequence and "last_pattern" not in player_data:
+        if len(move_sequence) >= 2:
+            player_data["last_pattern"] = pattern_key(move_sequence[-2], move_sequence[-1])
+        else:
+            # One move so far: the next move slides the window into a full pair
+            player_data["last_pattern"] = MOVE_IDX[move_sequence[-1]]
+    if move_sequence is not None and "move_head" not in player_data:
+        recent = [MOVE_IDX[move] for move in move_sequence[-MOVE_SEQUENCE_LENGTH:]]
+        player_data["move_sequence"] = recent + [-1] * (MOVE_SEQUENCE_LENGTH - len(recent))
+        player_data["move_head"] = len(recent) % MOVE_SEQUENCE_LENGTH
+    
+    patterns = player_data.get("pattern_history")
+    if not isinstance(patterns, dict):
+        return player_data
+    
+    migrated = empty_patterns()
+    for key, counts in patterns.items():
+        if isinstance(key, str):
+            if key.isdigit():
+                key = int(key)
+            else:
+                move1, move2 = [m.strip(" '\"") for m in key.strip("()").split(",")]
+                key = pattern_key(move1, move2)
+        if isinstance(counts, dict):
+            counts = [counts.get(move, 0) for move in MOVES]
+        migrated[key] = counts
+    player_data["pattern_history"] = migrated
+    return player_data
+
+
+def read_json_file(path):
+    """Read a whole JSON file as bytes and parse it in one json.loads call."""
+    with open(path, 'rb') as f:
+        return json.loads(f.read())
+
+
+def records_from_json(loaded_data):
+    """Convert a loaded {player_id: dict} mapping into PlayerStats records."""
+    return {pid: PlayerStats.from_dict(data) for pid, data in loaded_data.items()}
+
+
 def load_leaderboard():
     """Load LEADERBOARD from JSON file with integrity check."""
     global LEADERBOARD
@@ -165,20 +654,16 @@ def load_leaderboard():
         return
     
     try:
-        with open(DATA_FILE, 'r') as f:
-            save_data = json.load(f)
+        save_data = read_json_file(DATA_FILE)
         
         loaded_data = save_data.get("leaderboard", {})
         
-        # Verify checksum if present
-        if "checksum" in save_data:
-            expected = save_data["checksum"]
-            actual = calculate_checksum(loaded_data)
-            if expected != actual:
-                print("WARNING: Checksum mismatch! Loading from backup...")
-                return load_from_backup()
+        # Verify checksums if present
+        if not verify_snapshot(save_data, loaded_data):
+            print("WARNING: Checksum mismatch! Loading from backup...")
+            return load_from_backup()
         
-        LEADERBOARD = loaded_data
+        LEADERBOARD = records_from_json(loaded_data)
         print(f"Leaderboard loaded successfully ({len(LEADERBOARD)} players)")
         
         # Ensure CPU player exists
@@ -189,6 +674,174 @@ def load_leaderboard():
         load_from_backup()
 
 
+def wal_append(key, line):
+    """
+    Queue a single serialized change record for the write-ahead log.
+    
+    Each record is one JSON line, so the per-write cost is proportional to
+    the change rather than to the size of the whole LEADERBOARD. The record
+    is serialized by the caller, while the data is current, but written to
+    disk by the persistence thread so requests never wait on file I/O.
+    """
+    global LAST_MUTATION
+    WRITE_Q.put((key, line))
+    LAST_MUTATION = time.monotonic()
+    _WAL_EVENT.set()
+
+
+def request_flush():
+    """Ask the persistence thread to snapshot at its next wake-up."""
+    global FLUSH_REQUESTED
+    FLUSH_REQUESTED = True
+    _WAL_EVENT.set()
+
+
+def wal_fd():
+    """
+    Return the WAL descriptor, opening it on first use.
+    
+    Appends go straight to an O_APPEND descriptor with os.write, skipping
+    the buffered file object that would otherwise be opened per batch.
+    """
+    global WAL_FD
+    if WAL_FD is None:
+        WAL_FD = os.open(WAL_FILE, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    return WAL_FD
+
+
+def drain_write_queue():
+    """
+    Append every queued WAL record in one write. Caller holds PERSIST_LOCK.
+    
+    Records are full upserts, so when a player was logged several times
+    in the batch only their latest record is written.
+    """
+    global WAL_ENTRIES, SNAPSHOT_DIRTY
+    
+    pending = {}
+    while True:
+        try:
+            key, line = WRITE_Q.get_nowait()
+        except queue.Empty:
+            break
+        pending.pop(key, None)
+        pending[key] = line
+    if not pending:
+        return
+    lines = list(pending.values())
+    
+    try:
+        fd = wal_fd()
+        payload = memoryview(b''.join(lines))
+        while payload:
+            payload = payload[os.write(fd, payload):]
+        if WAL_FSYNC:
+            getattr(os, 'fdatasync', os.fsync)(fd)
+    except Exception as e:
+        print(f"WAL append failed: {e}")
+        SNAPSHOT_DIRTY = True
+        request_flush()
+        return
+    WAL_ENTRIES += len(lines)
+
+
+def wal_log_player(player_id):
+    """
+    Log the current record of a player to the WAL (upsert on replay).
+    
+    Every change to a record ends with this call, so the encoded record is
+    also kept in RECORD_JSON for the next snapshot to reuse, and the
+    player's cached leaderboard row is dropped.
+    """
+    record = LEADERBOARD[player_id]
+    encoded = encode_record(record)
+    RECORD_JSON[player_id] = (record, encoded)
+    _lb_rows.pop(player_id, None)
+    line = (b'{"op":"player","id":' + json.dumps(player_id).encode() +
+            b',"data":' + encoded +
+            b',"ts":"' + datetime.now().isoformat().encode() + b'"}\n')
+    return wal_append(player_id, line)
+
+
+def replay_wal():
+    """Re-apply WAL records written after the last snapshot."""
+    global WAL_ENTRIES
+    
+    if not os.path.exists(WAL_FILE):
+        return
+    
+    applied = 0
+    try:
+        with open(WAL_FILE, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn final line from an interrupted write
+                    break
+                if entry.get("op") == "player":
+                    LEADERBOARD[entry["id"]] = PlayerStats.from_dict(entry["data"])
+                    applied += 1
+    except Exception as e:
+        print(f"WAL replay failed: {e}")
+    
+    if applied:
+        print(f"Replayed {applied} WAL entries")
+    WAL_ENTRIES = applied
+
+
+def compact_wal():
+    """Fold the WAL into a fresh snapshot of DATA_FILE and truncate it."""
+    global WAL_ENTRIES, SNAPSHOT_DIRTY
+    
+    with PERSIST_LOCK:
+        # Anything still queued was logged before this snapshot is taken,
+        # so the snapshot already covers it
+        while True:
+            try:
+                WRITE_Q.get_nowait()
+            except queue.Empty:
+                break
+        if not save_leaderboard():
+            return False
+        try:
+            os.ftruncate(wal_fd(), 0)
+        except Exception as e:
+            print(f"WAL truncate failed: {e}")
+            return False
+        WAL_ENTRIES = 0
+        SNAPSHOT_DIRTY = False
+    return True
+
+
+def flush_wal():
+    """Compact the WAL only if it holds changes not yet in the snapshot."""
+    if WAL_ENTRIES or SNAPSHOT_DIRTY or not WRITE_Q.empty():
+        compact_wal()
+
+
+def persistence_worker():
+    """
+    Background loop that owns all routine disk writes.
+    
+    Wakes whenever records are queued (and at least once a second), appends
+    the whole pending batch to the WAL, then compacts the WAL into
+    DATA_FILE if a flush was requested, the leaderboard has been idle for
+    COMPACT_IDLE_SECONDS, or COMPACT_MAX_ENTRIES lines have piled up.
+    """
+    global FLUSH_REQUESTED
+    while True:
+        _WAL_EVENT.wait(1)
+        _WAL_EVENT.clear()
+        with PERSIST_LOCK:
+            drain_write_queue()
+        
+        idle = time.monotonic() - LAST_MUTATION >= COMPACT_IDLE_SECONDS
+        if FLUSH_REQUESTED or idle or WAL_ENTRIES >= COMPACT_MAX_ENTRIES:
+            FLUSH_REQUESTED = False
+            flush_wal()
+
+
 def load_from_backup():
     """Load from backup file if main file is corrupted."""
     global LEADERBOARD
@@ -200,9 +853,8 @@ def load_from_backup():
         return
     
     try:
-        with open(BACKUP_FILE, 'r') as f:
-            save_data = json.load(f)
-        LEADERBOARD = save_data.get("leaderboard", {})
+        save_data = read_json_file(BACKUP_FILE)
+        LEADERBOARD = records_from_json(save_data.get("leaderboard", {}))
         print(f"Loaded from backup ({len(LEADERBOARD)} players)")
         init_cpu_player()
     except Exception as e:
@@ -215,26 +867,22 @@ def init_cpu_player():
     """Initialize the CPU player if not exists."""
     global LEADERBOARD
     if CPU_ID not in LEADERBOARD:
-        LEADERBOARD[CPU_ID] = {
-            "id": CPU_ID,
-            "name": "CPU",
-            "score": 0,
-            "games_won": 0,
-            "games_played": 0,
-            "is_cpu": True,
-            "created_at": datetime.now().isoformat(),
-            "choice_history": {"rock": 0, "paper": 0, "scissors": 0}
-        }
+        LEADERBOARD[CPU_ID] = PlayerStats(CPU_ID, "CPU", is_cpu=True)
 
 
-# Load data on startup
+# Load data on startup, then re-apply anything logged since the last snapshot
 load_leaderboard()
+replay_wal()
+rebuild_indexes()
+threading.Thread(target=persistence_worker, daemon=True).start()
+atexit.register(flush_wal)
 
 
 # =============================================================================
 # AI STRATEGY FUNCTIONS
 # =============================================================================
-def get_strategic_cpu_choice(opponent_id):
+def get_strategic_cpu_choice(opponent_id, _random=random.random,
+                             _choice=random.choice):
     """
     AI Strategy: Analyze opponent's HISTORICAL play patterns and make strategic counter-pick.
     
@@ -245,7 +893,7 @@ def get_strategic_cpu_choice(opponent_id):
     
     The current round's choice is NOT available to this function because:
     1. Player's choice is stored in frontend memory only
-    2. record_player_choice() is called AFTER this function returns
+    2. play_round() records choices with record_choice() AFTER this returns
     3. No current-round data exists in LEADERBOARD when this runs
     
     Strategy Priority:
@@ -253,129 +901,228 @@ def get_strategic_cpu_choice(opponent_id):
     2. Frequency Analysis - Counter opponent's most common choice
     3. Weighted Random - Slight bias toward countering common moves
     4. Pure Random - Fallback when insufficient data
+    
+    The random helpers are bound as defaults so the per-call draws are
+    local lookups rather than module attribute lookups.
+    
+    Returns (choice, strategy_used, analysis); encode_cpu_choice() turns
+    them into the response body.
     """
-    choices = ["rock", "paper", "scissors"]
-    MIN_HISTORY_THRESHOLD = 5
-    MIN_PATTERN_THRESHOLD = 3
+    choices = MOVES
+    RANDOMNESS_FACTOR = 0.15
     
     # Get player data by their unique ID
     player_data = get_player_by_id(opponent_id)
     
     if not player_data:
-        return {
-            "choice": random.choice(choices),
-            "strategy_used": "random",
-            "confidence": 0,
-            "analysis": "Unknown player ID"
-        }
+        return _choice(choices), "random", UNKNOWN_OPPONENT_ANALYSIS
+    
+    analysis = analyze_opponent(opponent_id, player_data)
+    strategy = analysis["strategy"]
+    
+    if strategy == "pattern":
+        final_choice = analysis["counter"]
+        strategy_used = strategy
+    elif strategy == "frequency":
+        if _random() < RANDOMNESS_FACTOR:
+            final_choice = _choice(choices)
+            strategy_used = "random_variation"
+        else:
+            final_choice = analysis["counter"]
+            strategy_used = strategy
+    elif strategy == "weighted":
+        # Three outcomes: two comparisons pick the slot without a bisect call
+        cum_weights = analysis["cum_weights"]
+        point = _random() * cum_weights[2]
+        if point < cum_weights[0]:
+            final_choice = choices[0]
+        elif point < cum_weights[1]:
+            final_choice = choices[1]
+        else:
+            final_choice = choices[2]
+        strategy_used = strategy
+    else:
+        final_choice = _choice(choices)
+        strategy_used = strategy
     
-    player_name = player_data.get("name", "Unknown")
-    history = player_data.get("choice_history", {"rock": 0, "paper": 0, "scissors": 0})
-    total_choices = sum(history.values())
+    return final_choice, strategy_used, analysis
+
+
+def encode_cpu_choice(choice, strategy_used, analysis):
+    """
+    Build the /api/cpu/strategic_choice body as bytes.
     
+    Everything except the choice and strategy comes from the analysis,
+    which is memoized, so its JSON is encoded once and stored on it. Each
+    call then only splices the two per-call strings in front.
+    """
+    details_json = analysis.get("details_json")
+    if details_json is None:
+        # Drop the opening brace so the fields can follow choice/strategy
+        details_json = encode_json(analysis["details"])[1:]
+        analysis["details_json"] = details_json
+    return (b'{"choice":"' + choice.encode() + b'","strategy_used":"' +
+            strategy_used.encode() + b'",' + details_json)
+
+
+def argmax3(counts):
+    """
+    Index of the largest of three counts, the first one on ties.
+    
+    Same result as max(range(3), key=counts.__getitem__), but with plain
+    comparisons instead of a key callback per element.
+    """
+    rock, paper, scissors = counts
+    if rock >= paper:
+        return 0 if rock >= scissors else 2
+    return 1 if paper >= scissors else 2
+
+
+def decide_strategy(history, total_choices, pattern_counts):
+    """
+    Numeric core of the AI decision, working on move indices and counts only.
+    
+    history: [rock, paper, scissors] counts for the opponent
+    total_choices: running sum of history
+    pattern_counts: counts for the opponent's current 2-move pattern, or None
+    
+    Returns (strategy, predicted_idx, confidence, occurrences):
+    - strategy: "learning", "pattern", "frequency" or "weighted"
+    - predicted_idx: predicted opponent move (-1 when there is no prediction)
+    - confidence: share of occurrences that picked the predicted move
+    - occurrences: how many samples the prediction is based on
+    """
     if total_choices < MIN_HISTORY_THRESHOLD:
-        return {
-            "choice": random.choice(choices),
-            "strategy_used": "learning",
-            "confidence": total_choices,
-            "analysis": f"Learning {player_name}'s patterns ({total_choices}/{MIN_HISTORY_THRESHOLD} moves)",
-            "player_id": opponent_id,
-            "player_name": player_name
-        }
+        return "learning", -1, 0.0, total_choices
     
     # Strategy 1: Pattern Recognition
-    move_sequence = player_data.get("move_sequence", [])
-    pattern_history = player_data.get("pattern_history", {})
-    
-    if len(move_sequence) >= 2:
-        last_pattern = str(tuple(move_sequence[-2:]))
-        if last_pattern in pattern_history:
-            pattern_data = pattern_history[last_pattern]
-            pattern_total = sum(pattern_data.values())
-            
-            if pattern_total >= MIN_PATTERN_THRESHOLD:
-                predicted_move = max(pattern_data, key=pattern_data.get)
-                pattern_confidence = pattern_data[predicted_move] / pattern_total
-                
-                if pattern_confidence > 0.5:
-                    counter = COUNTER_MOVES[predicted_move]
-                    return {
-                        "choice": counter,
-                        "strategy_used": "pattern",
-                        "confidence": round(pattern_confidence * 100),
-                        "analysis": f"Detected {player_name}'s pattern: after {last_pattern}, picks {predicted_move}",
-                        "predicted_opponent_move": predicted_move,
-                        "pattern_occurrences": pattern_total,
-                        "player_id": opponent_id,
-                        "player_name": player_name
-                    }
+    if pattern_counts:
+        pattern_total = pattern_counts[0] + pattern_counts[1] + pattern_counts[2]
+        if pattern_total >= MIN_PATTERN_THRESHOLD:
+            predicted_idx = argmax3(pattern_counts)
+            confidence = pattern_counts[predicted_idx] / pattern_total
+            if confidence > PATTERN_CONFIDENCE:
+                return "pattern", predicted_idx, confidence, pattern_total
     
     # Strategy 2: Frequency Analysis
-    probabilities = {
-        "rock": history["rock"] / total_choices,
-        "paper": history["paper"] / total_choices,
-        "scissors": history["scissors"] / total_choices
-    }
+    predicted_idx = argmax3(history)
+    confidence = history[predicted_idx] / total_choices
+    if confidence > FREQUENCY_CONFIDENCE:
+        return "frequency", predicted_idx, confidence, total_choices
     
-    predicted_choice = max(probabilities, key=probabilities.get)
-    prediction_confidence = probabilities[predicted_choice]
-    
-    if prediction_confidence > 0.4:
-        optimal_counter = COUNTER_MOVES[predicted_choice]
-        
-        RANDOMNESS_FACTOR = 0.15
-        
-        if random.random() < RANDOMNESS_FACTOR:
-            final_choice = random.choice(choices)
-            strategy = "random_variation"
-        else:
-            final_choice = optimal_counter
-            strategy = "frequency"
-        
-        return {
-            "choice": final_choice,
-            "strategy_used": strategy,
-            "confidence": round(prediction_confidence * 100),
-            "analysis": f"{player_name} favors {predicted_choice} ({prediction_confidence*100:.1f}%)",
-            "player_tendencies": {
-                "rock": f"{probabilities['rock']*100:.1f}%",
-                "paper": f"{probabilities['paper']*100:.1f}%",
-                "scissors": f"{probabilities['scissors']*100:.1f}%"
-            },
+    # Strategy 3: Weighted Random
+    return "weighted", -1, 0.0, total_choices
+
+
+def analyze_opponent(opponent_id, player_data):
+    """
+    Deterministic half of the AI: pick a strategy from the opponent's history.
+    
+    The numeric decision is made by decide_strategy(); this function maps
+    its result back to moves and response text. The result depends only on
+    completed-round data, so it is memoized in AI_CACHE under a
+    (moves in sequence, total choices) fingerprint and recomputed only
+    after record_choice() runs for this player. Random draws stay in
+    get_strategic_cpu_choice() so repeat calls are not frozen to the same
+    choice.
+    
+    Returns a dict with:
+    - strategy: "learning", "pattern", "frequency" or "weighted"
+    - counter: the move to play for pattern/frequency strategies
+    - cum_weights: cumulative selection weights for the weighted strategy
+    - details: response fields besides choice and strategy_used
+    """
+    player_name = player_data.name
+    history = player_data.choice_history
+    total_choices = player_data.total_choices
+    
+    fingerprint = (player_data.move_head, total_choices)
+    cached = AI_CACHE.get(opponent_id)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+    
+    pattern_counts = None
+    last_pattern = player_data.last_pattern
+    if has_two_moves(player_data):
+        pattern_counts = player_data.pattern_history[last_pattern]
+    
+    strategy, predicted_idx, confidence, occurrences = decide_strategy(
+        history, total_choices, pattern_counts
+    )
+    # Published to AI_CACHE only once complete: handlers read the cache
+    # without STATE_LOCK and must never see a half-built analysis
+    analysis = {"strategy": strategy, "counter": None, "cum_weights": None}
+    
+    if strategy == "learning":
+        analysis["details"] = {
+            "confidence": total_choices,
+            "analysis": f"Learning {player_name}'s patterns ({total_choices}/{MIN_HISTORY_THRESHOLD} moves)",
+            "player_id": opponent_id,
+            "player_name": player_name
+        }
+        AI_CACHE[opponent_id] = (fingerprint, analysis)
+        return analysis
+    
+    if strategy == "pattern":
+        predicted_move = MOVES[predicted_idx]
+        analysis["counter"] = MOVES[COUNTER_IDX[predicted_idx]]
+        analysis["details"] = {
+            "confidence": round(confidence * 100),
+            "analysis": f"Detected {player_name}'s pattern: after {(MOVES[last_pattern // 3], MOVES[last_pattern % 3])}, picks {predicted_move}",
+            "predicted_opponent_move": predicted_move,
+            "pattern_occurrences": occurrences,
+            "player_id": opponent_id,
+            "player_name": player_name
+        }
+        AI_CACHE[opponent_id] = (fingerprint, analysis)
+        return analysis
+    
+    if strategy == "frequency":
+        predicted_choice = MOVES[predicted_idx]
+        analysis["counter"] = MOVES[COUNTER_IDX[predicted_idx]]
+        analysis["details"] = {
+            "confidence": round(confidence * 100),
+            "analysis": f"{player_name} favors {predicted_choice} ({confidence*100:.1f}%)",
             "total_choices_analyzed": total_choices,
             "player_id": opponent_id,
             "player_name": player_name
         }
+        add_tendencies(analysis["details"], history, total_choices)
+        AI_CACHE[opponent_id] = (fingerprint, analysis)
+        return analysis
     
-    # Strategy 3: Weighted Random
-    weights = []
-    for choice in choices:
-        beats = RPS_RULES[choice]["beats"]
-        weight = 1 + (history.get(beats, 0) / max(total_choices, 1))
-        weights.append(weight)
+    # Weighted: cumulative (unnormalized) weights, so a pick compares a
+    # random point in [0, total) against the running sums
+    total = max(total_choices, 1)
+    weights = [1 + history[beats] / total for beats in BEATS_IDX]
     
-    total_weight = sum(weights)
-    weights = [w / total_weight for w in weights]
-    final_choice = random.choices(choices, weights=weights, k=1)[0]
+    cum_weights = [weights[0], weights[0] + weights[1], weights[0] + weights[1] + weights[2]]
     
-    return {
-        "choice": final_choice,
-        "strategy_used": "weighted",
-        "confidence": round(max(weights) * 100),
+    analysis["cum_weights"] = cum_weights
+    analysis["details"] = {
+        "confidence": round(max(weights) / cum_weights[2] * 100),
         "analysis": f"No strong pattern for {player_name}, using weighted random",
-        "player_tendencies": {
-            "rock": f"{probabilities['rock']*100:.1f}%",
-            "paper": f"{probabilities['paper']*100:.1f}%",
-            "scissors": f"{probabilities['scissors']*100:.1f}%"
-        },
         "player_id": opponent_id,
         "player_name": player_name
     }
+    add_tendencies(analysis["details"], history, total_choices)
+    AI_CACHE[opponent_id] = (fingerprint, analysis)
+    return analysis
+
 
+def add_tendencies(details, history, total_choices):
+    """Add formatted per-move percentages to CPU response details if enabled."""
+    if not CPU_VERBOSE_ANALYSIS:
+        return
+    details["player_tendencies"] = {
+        move: f"{count / total_choices * 100:.1f}%"
+        for move, count in zip(MOVES, history)
+    }
 
-def record_player_choice(player_id, choice):
+
+def record_choice(player_data, choice_idx):
     """
-    Record a player's choice for AI learning using their unique ID.
+    Record a validated move index on a player record for AI learning.
     
     IMPORTANT: This function is ONLY called AFTER a round is complete.
     The CPU makes its strategic choice BEFORE this is called, ensuring
@@ -389,50 +1136,31 @@ def record_player_choice(player_id, choice):
     Flow:
     1. Player 1 picks -> Frontend stores locally (NOT sent to server yet)
     2. CPU calls /api/cpu/strategic_choice -> Uses ONLY historical data
-    3. Both choices sent to /api/game/play_round -> THIS function records them
+    3. Both choices sent to /api/game/play_round -> play_round() records
+       them here, then logs each record with wal_log_player()
     """
-    player_data = get_player_by_id(player_id)
-    
-    if not player_data or choice not in ["rock", "paper", "scissors"]:
-        return
-    
     # Skip tracking for CPU
-    if player_data.get("is_cpu", False):
+    if player_data.is_cpu:
         return
     
-    # Initialize tracking structures if needed
-    if "choice_history" not in player_data:
-        player_data["choice_history"] = {"rock": 0, "paper": 0, "scissors": 0}
-    if "move_sequence" not in player_data:
-        player_data["move_sequence"] = []
-    if "pattern_history" not in player_data:
-        player_data["pattern_history"] = {}
-    
     # Update frequency count
-    player_data["choice_history"][choice] += 1
+    player_data.choice_history[choice_idx] += 1
+    player_data.total_choices += 1
+    AI_CACHE.pop(player_data.id, None)
     
     # Record pattern: what move follows the last 2 moves
-    move_seq = player_data["move_sequence"]
-    if len(move_seq) >= 2:
-        pattern_key = str(tuple(move_seq[-2:]))
-        if pattern_key not in player_data["pattern_history"]:
-            player_data["pattern_history"][pattern_key] = {"rock": 0, "paper": 0, "scissors": 0}
-        player_data["pattern_history"][pattern_key][choice] += 1
-    
-    # Update move sequence (keep last 10 moves)
-    move_seq.append(choice)
-    if len(move_seq) > 10:
-        move_seq.pop(0)
-
-
-def determine_round_winner(choice1, choice2):
-    """Determine the winner of a single round."""
-    if choice1 == choice2:
-        return "tie"
-    elif RPS_RULES[choice1]["beats"] == choice2:
-        return "player1"
-    else:
-        return "player2"
+    last_pattern = player_data.last_pattern
+    move_sequence = player_data.move_sequence
+    head = player_data.move_head
+    if move_sequence[head - 2] >= 0:
+        player_data.pattern_history[last_pattern][choice_idx] += 1
+    
+    # Slide the packed 2-move window: drop the older move, add this one
+    player_data.last_pattern = (last_pattern % 3) * 3 + choice_idx
+    
+    # Update move sequence: overwrite the oldest slot of the ring buffer
+    move_sequence[head] = choice_idx
+    player_data.move_head = (head + 1) % MOVE_SEQUENCE_LENGTH
 
 
 # =============================================================================
@@ -450,123 +1178,161 @@ def register_player():
     Always creates a new player entry, even if name already exists.
     This allows multiple players to have the same display name.
     """
-    data = request.get_json()
+    data = read_json_body()
     player_name = data.get('name', '').strip()
     is_cpu = data.get('is_cpu', False)
     
     if not player_name:
-        return jsonify({"error": "Player name is required"}), 400
+        return json_response({"error": "Player name is required"}, 400)
     
     # Handle CPU specially - use fixed ID
     if is_cpu or player_name.upper() == "CPU":
-        return jsonify({
-            "message": "CPU player ready",
-            "player": {
-                "id": CPU_ID,
-                "name": "CPU",
-                "stats": LEADERBOARD[CPU_ID]
-            }
-        }), 200
+        return player_response("CPU player ready", CPU_ID, "CPU", 200)
     
     # Generate unique ID for new player
     player_id = generate_player_id()
     
-    LEADERBOARD[player_id] = {
-        "id": player_id,
-        "name": player_name,
-        "score": 0,
-        "games_won": 0,
-        "games_played": 0,
-        "is_cpu": False,
-        "created_at": datetime.now().isoformat(),
-        "choice_history": {"rock": 0, "paper": 0, "scissors": 0},
-        "move_sequence": [],
-        "pattern_history": {}
-    }
+    with STATE_LOCK:
+        LEADERBOARD[player_id] = PlayerStats(player_id, player_name)
+        index_player(player_id)
+        mark_leaderboard_changed()
+        wal_log_player(player_id)
     
-    save_leaderboard()
+    return player_response(
+        f"Player '{player_name}' registered successfully", player_id, player_name, 201
+    )
+
+
+def public_stats(record):
+    """
+    A player record in the layout the API has always returned.
     
-    return jsonify({
-        "message": f"Player '{player_name}' registered successfully",
-        "player": {
-            "id": player_id,
-            "name": player_name,
-            "stats": LEADERBOARD[player_id]
-        }
-    }), 201
+    Records store move data as index lists, a ring buffer and a packed
+    pattern table. Clients still get per-move counts keyed by move name,
+    the last moves oldest first, and pattern counts keyed by move pair,
+    e.g. "('rock', 'paper')": {"rock": 1, "paper": 0, "scissors": 2}.
+    """
+    stats = {
+        "id": record.id,
+        "name": record.name,
+        "score": record.score,
+        "games_won": record.games_won,
+        "games_played": record.games_played,
+        "is_cpu": record.is_cpu,
+        "created_at": record.created_at,
+        "choice_history": dict(zip(MOVES, record.choice_history))
+    }
+    # The CPU's moves are never tracked
+    if record.is_cpu:
+        return stats
+    
+    ring = record.move_sequence
+    head = record.move_head
+    stats["move_sequence"] = [
+        MOVES[ring[(head + i) % MOVE_SEQUENCE_LENGTH]]
+        for i in range(MOVE_SEQUENCE_LENGTH)
+        if ring[(head + i) % MOVE_SEQUENCE_LENGTH] >= 0
+    ]
+    stats["pattern_history"] = {
+        str((MOVES[key // 3], MOVES[key % 3])): dict(zip(MOVES, counts))
+        for key, counts in enumerate(record.pattern_history)
+        if any(counts)
+    }
+    return stats
+
+
+def player_response(message, player_id, name, status):
+    """Build a registration response around the player's public stats."""
+    with STATE_LOCK:
+        stats = encode_json(public_stats(LEADERBOARD[player_id]))
+    body = (b'{"message":' + encode_json(message) +
+            b',"player":{"id":' + encode_json(player_id) +
+            b',"name":' + encode_json(name) +
+            b',"stats":' + stats + b'}}')
+    return Response(body, status=status, mimetype='application/json')
 
 
 @app.route('/api/player/<player_id>/stats', methods=['GET'])
 def get_player_stats(player_id):
-    """Get detailed statistics for a specific player by their unique ID."""
+    """
+    Get detailed statistics for a specific player by their unique ID.
+    
+    The response is built from the record's fields directly; pattern data
+    and move history are never copied into it.
+    """
     player = get_player_by_id(player_id)
     
     if not player:
-        return jsonify({"error": "Player not found"}), 404
+        return json_response({"error": "Player not found"}, 404)
     
-    history = player.get("choice_history", {"rock": 0, "paper": 0, "scissors": 0})
-    total = sum(history.values())
+    total = player.total_choices
+    if total > 0:
+        percentages = {
+            move: round(count / total * 100, 1)
+            for move, count in zip(MOVES, player.choice_history)
+        }
+    else:
+        percentages = {"rock": 0, "paper": 0, "scissors": 0}
     
     stats = {
         "id": player_id,
-        "name": player["name"],
-        "score": player["score"],
-        "games_won": player["games_won"],
-        "games_played": player["games_played"],
+        "name": player.name,
+        "score": player.score,
+        "games_won": player.games_won,
+        "games_played": player.games_played,
         "total_choices": total,
-        "choice_percentages": {
-            "rock": round(history["rock"] / total * 100, 1) if total > 0 else 0,
-            "paper": round(history["paper"] / total * 100, 1) if total > 0 else 0,
-            "scissors": round(history["scissors"] / total * 100, 1) if total > 0 else 0
-        }
+        "choice_percentages": percentages
     }
     
-    return jsonify(stats), 200
+    return json_response(stats, 200)
 
 
 @app.route('/api/game/start', methods=['POST'])
 def start_game():
     """Start a new game between two players using their unique IDs."""
     global GAME_STATE
-    data = request.get_json()
+    data = read_json_body()
     
     player1_id = data.get('player1_id', '').strip()
     player2_id = data.get('player2_id', '').strip()
     
     if not player1_id or not player2_id:
-        return jsonify({"error": "Both player IDs are required"}), 400
-    
-    player1 = get_player_by_id(player1_id)
-    player2 = get_player_by_id(player2_id)
-    
-    if not player1 or not player2:
-        return jsonify({"error": "Both players must be registered first"}), 400
-    
-    GAME_STATE = {
-        "player1_id": player1_id,
-        "player2_id": player2_id,
-        "player1_name": player1["name"],
-        "player2_name": player2["name"],
-        "player1_round_wins": 0,
-        "player2_round_wins": 0,
-        "current_round": 0,
-        "game_active": True,
-        "previous_winner_id": GAME_STATE.get("previous_winner_id"),
-        "previous_winner_name": GAME_STATE.get("previous_winner_name"),
-        "game_history": []
-    }
+        return json_response({"error": "Both player IDs are required"}, 400)
     
-    save_leaderboard()
+    # Looked up under the lock so a concurrent reset cannot delete the
+    # players between this check and the new game referencing them
+    with STATE_LOCK:
+        player1 = get_player_by_id(player1_id)
+        player2 = get_player_by_id(player2_id)
+        
+        if not player1 or not player2:
+            return json_response({"error": "Both players must be registered first"}, 400)
+        
+        GAME_STATE = {
+            "player1_id": player1_id,
+            "player2_id": player2_id,
+            "player1_name": player1.name,
+            "player2_name": player2.name,
+            "player1_round_wins": 0,
+            "player2_round_wins": 0,
+            "current_round": 0,
+            "game_active": True,
+            "previous_winner_id": GAME_STATE.get("previous_winner_id"),
+            "previous_winner_name": GAME_STATE.get("previous_winner_name"),
+            # One slot per round, filled in by play_round
+            "game_history": [None] * 10
+        }
+        mark_game_state_changed()
     
-    return jsonify({
+    return json_response({
         "message": "Game started",
         "game_state": {
-            "player1": {"id": player1_id, "name": player1["name"]},
-            "player2": {"id": player2_id, "name": player2["name"]},
+            "player1": {"id": player1_id, "name": player1.name},
+            "player2": {"id": player2_id, "name": player2.name},
             "current_round": 0,
             "game_active": True
         }
-    }), 200
+    }, 200)
 
 
 @app.route('/api/game/play_round', methods=['POST'])
@@ -583,117 +1349,138 @@ def play_round():
     
     This ensures CPU only ever sees completed round data, never current round.
     """
-    global GAME_STATE
-    
-    if not GAME_STATE["game_active"]:
-        return jsonify({"error": "No active game"}), 400
-    
-    if GAME_STATE["current_round"] >= 10:
-        return jsonify({"error": "Game is over"}), 400
-    
-    data = request.get_json()
+    data = read_json_body()
     choice1 = data.get('player1_choice', '').lower()
     choice2 = data.get('player2_choice', '').lower()
     
-    valid_choices = ['rock', 'paper', 'scissors']
-    if choice1 not in valid_choices or choice2 not in valid_choices:
-        return jsonify({"error": "Invalid choice"}), 400
-    
-    player1_id = GAME_STATE["player1_id"]
-    player2_id = GAME_STATE["player2_id"]
-    
-    # Record choices for AI learning AFTER both players have committed
-    # This is when choices become "historical" data for future CPU analysis
-    record_player_choice(player1_id, choice1)
-    record_player_choice(player2_id, choice2)
-    
-    GAME_STATE["current_round"] += 1
-    
-    round_result = determine_round_winner(choice1, choice2)
-    
-    round_data = {
-        "round": GAME_STATE["current_round"],
-        "player1_choice": choice1,
-        "player2_choice": choice2,
-        "result": round_result
-    }
-    
-    if round_result == "player1":
-        GAME_STATE["player1_round_wins"] += 1
-        LEADERBOARD[player1_id]["score"] += 1
-    elif round_result == "player2":
-        GAME_STATE["player2_round_wins"] += 1
-        LEADERBOARD[player2_id]["score"] += 1
-    
-    GAME_STATE["game_history"].append(round_data)
-    
-    game_over = GAME_STATE["current_round"] >= 10
-    game_winner_id = None
-    game_winner_name = None
-    
-    if game_over:
-        GAME_STATE["game_active"] = False
+    # Critical section: GAME_STATE and LEADERBOARD are read and updated
+    # together, so concurrent rounds cannot interleave
+    with STATE_LOCK:
+        # Local alias: one global lookup instead of one per access below
+        state = GAME_STATE
+        if not state["game_active"]:
+            return json_response({"error": "No active game"}, 400)
+    
+        if state["current_round"] >= 10:
+            return json_response({"error": "Game is over"}, 400)
+    
+        # Move indices double as validation: unknown choices map to None
+        idx1 = MOVE_IDX.get(choice1)
+        idx2 = MOVE_IDX.get(choice2)
+        if idx1 is None or idx2 is None:
+            return json_response({"error": "Invalid choice"}, 400)
+    
+        player1_id = state["player1_id"]
+        player2_id = state["player2_id"]
+    
+        # Record choices for AI learning AFTER both players have committed
+        # This is when choices become "historical" data for future CPU analysis
+        player1 = LEADERBOARD[player1_id]
+        player2 = LEADERBOARD[player2_id]
+        record_choice(player1, idx1)
+        record_choice(player2, idx2)
+    
+        current_round = state["current_round"] + 1
+        state["current_round"] = current_round
+        mark_game_state_changed()
+    
+        round_result = ROUND_RESULTS[idx1 * 3 + idx2]
+    
+        if round_result == "player1":
+            state["player1_round_wins"] += 1
+            add_score(player1_id, 1)
+        elif round_result == "player2":
+            state["player2_round_wins"] += 1
+            add_score(player2_id, 1)
+    
+        # History keeps the compact (round, move index, move index) form;
+        # get_game_state expands it with round_record()
+        state["game_history"][current_round - 1] = (current_round, idx1, idx2)
+    
+        game_over = current_round >= 10
+        game_winner_id = None
+        game_winner_name = None
+    
+        if game_over:
+            state["game_active"] = False
         
-        if GAME_STATE["player1_round_wins"] > GAME_STATE["player2_round_wins"]:
-            game_winner_id = player1_id
-            game_winner_name = GAME_STATE["player1_name"]
-            LEADERBOARD[player1_id]["games_won"] += 1
-        elif GAME_STATE["player2_round_wins"] > GAME_STATE["player1_round_wins"]:
-            game_winner_id = player2_id
-            game_winner_name = GAME_STATE["player2_name"]
-            LEADERBOARD[player2_id]["games_won"] += 1
+            if state["player1_round_wins"] > state["player2_round_wins"]:
+                game_winner_id = player1_id
+                game_winner_name = state["player1_name"]
+                player1.games_won += 1
+            elif state["player2_round_wins"] > state["player1_round_wins"]:
+                game_winner_id = player2_id
+                game_winner_name = state["player2_name"]
+                player2.games_won += 1
         
-        LEADERBOARD[player1_id]["games_played"] += 1
-        LEADERBOARD[player2_id]["games_played"] += 1
+            player1.games_played += 1
+            player2.games_played += 1
         
-        # Store winner for retention (skip CPU)
-        if game_winner_id and game_winner_id != CPU_ID:
-            GAME_STATE["previous_winner_id"] = game_winner_id
-            GAME_STATE["previous_winner_name"] = game_winner_name
-        else:
-            GAME_STATE["previous_winner_id"] = None
-            GAME_STATE["previous_winner_name"] = None
-    
-    save_leaderboard()
-    
-    return jsonify({
-        "round": round_data,
-        "game_state": {
-            "current_round": GAME_STATE["current_round"],
-            "player1_round_wins": GAME_STATE["player1_round_wins"],
-            "player2_round_wins": GAME_STATE["player2_round_wins"],
-            "game_active": GAME_STATE["game_active"]
-        },
-        "game_over": game_over,
-        "game_winner": {
-            "id": game_winner_id,
-            "name": game_winner_name
-        } if game_winner_id else None
-    }), 200
+            # Store winner for retention (skip CPU)
+            if game_winner_id and game_winner_id != CPU_ID:
+                state["previous_winner_id"] = game_winner_id
+                state["previous_winner_name"] = game_winner_name
+            else:
+                state["previous_winner_id"] = None
+                state["previous_winner_name"] = None
+    
+        mark_leaderboard_changed()
+        wal_log_player(player1_id)
+        wal_log_player(player2_id)
+        if game_over:
+            request_flush()
+    
+        body = encode_round_response(
+            current_round, choice1, choice2, round_result,
+            state["player1_round_wins"], state["player2_round_wins"],
+            state["game_active"], game_over, game_winner_id, game_winner_name
+        )
+    
+    return Response(body, status=200, mimetype='application/json')
 
 
 @app.route('/api/game/state', methods=['GET'])
 def get_game_state():
-    """Get current game state."""
-    return jsonify({
-        "game_active": GAME_STATE["game_active"],
-        "player1": {
-            "id": GAME_STATE["player1_id"],
-            "name": GAME_STATE["player1_name"]
-        },
-        "player2": {
-            "id": GAME_STATE["player2_id"],
-            "name": GAME_STATE["player2_name"]
-        },
-        "current_round": GAME_STATE["current_round"],
-        "player1_round_wins": GAME_STATE["player1_round_wins"],
-        "player2_round_wins": GAME_STATE["player2_round_wins"],
-        "previous_winner": {
-            "id": GAME_STATE["previous_winner_id"],
-            "name": GAME_STATE["previous_winner_name"]
-        } if GAME_STATE["previous_winner_id"] else None,
-        "game_history": GAME_STATE["game_history"]
-    }), 200
+    """
+    Get current game state.
+    
+    Optional ?since=N returns only the rounds after round N in
+    game_history, so a polling client does not receive rounds it already
+    has. Responses carry an ETag; a matching If-None-Match gets 304.
+    """
+    since = max(request.args.get('since', default=0, type=int), 0)
+    etag = f"{GAME_STATE_TOKEN}-{GAME_STATE_VERSION}-{since}"
+    if etag in request.if_none_match:
+        return not_modified(etag)
+    
+    with STATE_LOCK:
+        etag = f"{GAME_STATE_TOKEN}-{GAME_STATE_VERSION}-{since}"
+        state = {
+            "game_active": GAME_STATE["game_active"],
+            "player1": {
+                "id": GAME_STATE["player1_id"],
+                "name": GAME_STATE["player1_name"]
+            },
+            "player2": {
+                "id": GAME_STATE["player2_id"],
+                "name": GAME_STATE["player2_name"]
+            },
+            "current_round": GAME_STATE["current_round"],
+            "player1_round_wins": GAME_STATE["player1_round_wins"],
+            "player2_round_wins": GAME_STATE["player2_round_wins"],
+            "previous_winner": {
+                "id": GAME_STATE["previous_winner_id"],
+                "name": GAME_STATE["previous_winner_name"]
+            } if GAME_STATE["previous_winner_id"] else None,
+            "game_history": [
+                round_record(entry)
+                for entry in GAME_STATE["game_history"][since:GAME_STATE["current_round"]]
+            ]
+        }
+    
+    response = json_response(state, 200)
+    response.set_etag(etag)
+    return response
 
 
 @app.route('/api/cpu/strategic_choice', methods=['POST'])
@@ -709,15 +1496,15 @@ def cpu_strategic_choice():
     
     This ensures the CPU never "cheats" by seeing what the player picked this round.
     """
-    data = request.get_json()
+    data = read_json_body()
     opponent_id = data.get('opponent_id', '').strip()
     
     if not opponent_id:
-        return jsonify({"error": "Opponent ID is required"}), 400
+        return json_response({"error": "Opponent ID is required"}, 400)
     
-    result = get_strategic_cpu_choice(opponent_id)
+    body = encode_cpu_choice(*get_strategic_cpu_choice(opponent_id))
     
-    return jsonify(result), 200
+    return Response(body, status=200, mimetype='application/json')
 
 
 @app.route('/api/leaderboard', methods=['GET'])
@@ -725,32 +1512,72 @@ def get_leaderboard():
     """
     Retrieves the complete leaderboard with two sorted views.
     Includes unique IDs for each player.
+    
+    Both views are read straight from the sort indexes, which are kept
+    ordered as players register and score, so no sorting happens here.
+    The serialized body is cached until the leaderboard changes, and
+    clients polling with a matching If-None-Match get 304 Not Modified.
     """
-    # Convert Dictionary to List of Dictionaries
-    players_list = [
-        {
-            "id": player_id,
-            "name": stats["name"],
-            "score": stats["score"],
-            "games_won": stats["games_won"],
-            "games_played": stats["games_played"],
-            "is_cpu": stats.get("is_cpu", False),
-            "total_rounds": sum(stats.get("choice_history", {}).values())
+    global _lb_cache
+    
+    version, body, etag = _lb_cache
+    if version == LEADERBOARD_VERSION:
+        if etag in request.if_none_match:
+            return not_modified(etag)
+        return leaderboard_response(body, etag)
+    
+    with STATE_LOCK:
+        version = LEADERBOARD_VERSION
+        
+        # One encoded display entry per player, shared by both views
+        rows = {
+            player_id: leaderboard_row(player_id, stats)
+            for player_id, stats in LEADERBOARD.items()
         }
-        for player_id, stats in LEADERBOARD.items()
-    ]
+        
+        # View 1: Alphabetically by name (case-insensitive)
+        sorted_by_name = b','.join([rows[entry[2]] for entry in NAME_INDEX])
+        
+        # View 2: Numerically by score (descending)
+        sorted_by_score = b','.join([rows[entry[3]] for entry in SCORE_INDEX])
     
-    # Sorting Algorithm 1: Alphabetically by name (case-insensitive)
-    sorted_by_name = sorted(players_list, key=lambda x: x["name"].lower())
+    body = (b'{"total_players":' + str(len(rows)).encode() +
+            b',"sorted_by_name":[' + sorted_by_name +
+            b'],"sorted_by_score":[' + sorted_by_score + b']}')
+    etag = hashlib.sha256(body).hexdigest()[:16]
+    _lb_cache = (version, body, etag)
     
-    # Sorting Algorithm 2: Numerically by score (descending)
-    sorted_by_score = sorted(players_list, key=lambda x: (-x["score"], x["name"].lower()))
+    return leaderboard_response(body, etag)
+
+
+def leaderboard_row(player_id, stats):
+    """
+    Encoded leaderboard entry for one player, from _lb_rows when current.
     
-    return jsonify({
-        "total_players": len(players_list),
-        "sorted_by_name": sorted_by_name,
-        "sorted_by_score": sorted_by_score
-    }), 200
+    Only players changed since the last build are encoded again; the rest
+    of the body is assembled by joining cached bytes.
+    """
+    cached = _lb_rows.get(player_id)
+    if cached and cached[0] is stats:
+        return cached[1]
+    row = encode_json({
+        "id": player_id,
+        "name": stats.name,
+        "score": stats.score,
+        "games_won": stats.games_won,
+        "games_played": stats.games_played,
+        "is_cpu": stats.is_cpu,
+        "total_rounds": stats.total_choices
+    })
+    _lb_rows[player_id] = (stats, row)
+    return row
+
+
+def leaderboard_response(body, etag):
+    """Build a response from a cached leaderboard body and its ETag."""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
 
 
 @app.route('/api/reset', methods=['POST'])
@@ -758,30 +1585,43 @@ def reset_tournament():
     """Reset all tournament data."""
     global LEADERBOARD, GAME_STATE
     
-    LEADERBOARD = {}
-    init_cpu_player()
-    
-    GAME_STATE = {
-        "player1_id": None,
-        "player2_id": None,
-        "player1_name": None,
-        "player2_name": None,
-        "player1_round_wins": 0,
-        "player2_round_wins": 0,
-        "current_round": 0,
-        "game_active": False,
-        "previous_winner_id": None,
-        "previous_winner_name": None,
-        "game_history": []
-    }
+    with STATE_LOCK:
+        LEADERBOARD = {}
+        RECORD_JSON.clear()
+        _lb_rows.clear()
+        init_cpu_player()
+        rebuild_indexes()
+        mark_leaderboard_changed()
+        AI_CACHE.clear()
+        
+        GAME_STATE = {
+            "player1_id": None,
+            "player2_id": None,
+            "player1_name": None,
+            "player2_name": None,
+            "player1_round_wins": 0,
+            "player2_round_wins": 0,
+            "current_round": 0,
+            "game_active": False,
+            "previous_winner_id": None,
+            "previous_winner_name": None,
+            "game_history": []
+        }
+        mark_game_state_changed()
     
-    save_leaderboard()
+    # Snapshot immediately so the WAL cannot resurrect removed players
+    compact_wal()
     
-    return jsonify({"message": "Tournament reset successfully"}), 200
+    return json_response({"message": "Tournament reset successfully"}, 200)
 
 
 # =============================================================================
 # Run the Flask application
 # =============================================================================
+# Development server only. Debug mode (reloader and debugger) is opt-in via
+# FLASK_DEBUG=1: the reloader imports this module twice, starting a second
+# persistence thread. For real use, serve app:app from ONE process with
+# threads (e.g. waitress-serve --threads=8 app:app); all state lives in
+# this process, so multiple worker processes would each diverge.
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1", port=5000, threaded=True)
\ No newline at end of file
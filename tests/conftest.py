@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """
+    Import app with its data files in a temporary directory.
+
+    app loads its data files relative to the working directory at import
+    time, so the import runs from the temporary directory. The file paths
+    are then made absolute: the persistence thread and the exit hook keep
+    writing there after the working directory is restored.
+    """
+    data_dir = tmp_path_factory.mktemp("data")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(data_dir)
+        mp.syspath_prepend(ROOT)
+        import app
+    for name in ("DATA_FILE", "BACKUP_FILE", "WAL_FILE"):
+        setattr(app, name, str(data_dir / getattr(app, name)))
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    """Flask test client on a freshly reset tournament."""
+    client = app_module.app.test_client()
+    client.post('/api/reset')
+    return client
@@ -0,0 +1,45 @@
+MOVES = [('rock', 'scissors'), ('paper', 'paper'), ('scissors', 'rock')]
+
+
+def start_and_play(client):
+    ids = [client.post('/api/player/register', json={'name': name}).get_json()['player']['id']
+           for name in ('Ann', 'Bob')]
+    client.post('/api/game/start', json={'player1_id': ids[0], 'player2_id': ids[1]})
+    for choice1, choice2 in MOVES:
+        client.post('/api/game/play_round',
+                    json={'player1_choice': choice1, 'player2_choice': choice2})
+
+
+def test_since_returns_only_later_rounds(client):
+    start_and_play(client)
+
+    full = client.get('/api/game/state').get_json()
+    assert [r['round'] for r in full['game_history']] == [1, 2, 3]
+    assert [(r['player1_choice'], r['player2_choice']) for r in full['game_history']] == MOVES
+
+    later = client.get('/api/game/state?since=2').get_json()
+    assert later['game_history'] == full['game_history'][2:]
+    assert later['current_round'] == full['current_round'] == 3
+
+    assert client.get('/api/game/state?since=3').get_json()['game_history'] == []
+    assert client.get('/api/game/state?since=-5').get_json()['game_history'] == full['game_history']
+
+
+def test_matching_etag_gets_304_until_state_changes(client):
+    start_and_play(client)
+
+    first = client.get('/api/game/state')
+    etag = first.headers['ETag']
+    cached = client.get('/api/game/state', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == etag
+    assert cached.data == b''
+
+    # Each ?since= view has its own tag
+    assert client.get('/api/game/state?since=1').headers['ETag'] != etag
+
+    client.post('/api/game/play_round', json={'player1_choice': 'rock', 'player2_choice': 'rock'})
+    changed = client.get('/api/game/state', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['current_round'] == 4
@@ -0,0 +1,40 @@
+def legacy_record(moves):
+    return {
+        "id": "p1",
+        "name": "Legacy",
+        "choice_history": {"rock": 0, "paper": 0, "scissors": 0},
+        "pattern_history": {},
+        "move_sequence": list(moves),
+    }
+
+
+def replay(app_module, moves, next_move):
+    player = app_module.PlayerStats.from_dict(
+        app_module.migrate_player(legacy_record(moves)))
+    app_module.record_choice(player, app_module.MOVE_IDX[next_move])
+    return player
+
+
+def test_migrate_empty_move_sequence(app_module):
+    player = replay(app_module, [], "paper")
+    assert player.last_pattern == app_module.MOVE_IDX["paper"]
+    assert all(counts == [0, 0, 0] for counts in player.pattern_history)
+
+
+def test_migrate_single_move_sequence(app_module):
+    data = app_module.migrate_player(legacy_record(["scissors"]))
+    assert data["last_pattern"] == app_module.MOVE_IDX["scissors"]
+
+    player = replay(app_module, ["scissors"], "rock")
+    assert player.last_pattern == app_module.pattern_key("scissors", "rock")
+    assert all(counts == [0, 0, 0] for counts in player.pattern_history)
+
+
+def test_migrate_two_move_sequence(app_module):
+    data = app_module.migrate_player(legacy_record(["rock", "paper"]))
+    assert data["last_pattern"] == app_module.pattern_key("rock", "paper")
+
+    player = replay(app_module, ["rock", "paper"], "scissors")
+    key = app_module.pattern_key("rock", "paper")
+    assert player.pattern_history[key] == [0, 0, 1]
+    assert player.last_pattern == app_module.pattern_key("paper", "scissors")
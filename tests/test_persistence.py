@@ -0,0 +1,109 @@
+import json
+import os
+import shutil
+
+from conftest import ROOT
+
+
+def restart(app):
+    """Rebuild the in-memory state from disk, as app does at startup."""
+    app.load_leaderboard()
+    app.replay_wal()
+    app.rebuild_indexes()
+
+
+def records(app):
+    return {pid: record.to_dict() for pid, record in app.LEADERBOARD.items()}
+
+
+def play_game(client, app):
+    """Register two players, play a few rounds and return their IDs."""
+    ids = [client.post('/api/player/register', json={'name': name}).get_json()['player']['id']
+           for name in ('Ann', 'Bob')]
+    client.post('/api/game/start', json={'player1_id': ids[0], 'player2_id': ids[1]})
+    for choice1, choice2 in [('rock', 'paper'), ('paper', 'paper'), ('scissors', 'paper')]:
+        client.post('/api/game/play_round',
+                    json={'player1_choice': choice1, 'player2_choice': choice2})
+    return ids
+
+
+def test_wal_replay_restores_leaderboard(client, app_module):
+    app = app_module
+    # Holding PERSIST_LOCK keeps the persistence thread from compacting
+    with app.PERSIST_LOCK:
+        ids = play_game(client, app)
+        app.drain_write_queue()
+        before = records(app)
+        assert app.WAL_ENTRIES > 0
+        with open(app.DATA_FILE) as f:
+            assert ids[0] not in f.read()
+
+        restart(app)
+
+    assert records(app) == before
+    assert app.WAL_ENTRIES > 0
+
+
+def test_torn_last_wal_line_is_ignored(client, app_module):
+    app = app_module
+    with app.PERSIST_LOCK:
+        play_game(client, app)
+        app.drain_write_queue()
+        before = records(app)
+        with open(app.WAL_FILE, 'ab') as f:
+            f.write(b'{"op":"player","id":"torn","data":{"na')
+
+        restart(app)
+
+    assert records(app) == before
+    assert "torn" not in app.LEADERBOARD
+
+
+def test_compact_wal_truncates_log(client, app_module):
+    app = app_module
+    with app.PERSIST_LOCK:
+        play_game(client, app)
+        app.drain_write_queue()
+        assert os.path.getsize(app.WAL_FILE) > 0
+        before = records(app)
+
+        assert app.compact_wal()
+        assert os.path.getsize(app.WAL_FILE) == 0
+        assert app.WAL_ENTRIES == 0
+
+        restart(app)
+
+    assert records(app) == before
+
+
+def test_reset_is_not_undone_by_restart(client, app_module):
+    app = app_module
+    with app.PERSIST_LOCK:
+        play_game(client, app)
+        app.drain_write_queue()
+        client.post('/api/reset')
+
+        restart(app)
+
+    assert list(app.LEADERBOARD) == [app.CPU_ID]
+
+
+def test_load_baseline_data_file(client, app_module):
+    app = app_module
+    baseline = os.path.join(ROOT, 'leaderboard_data.json')
+    with open(baseline) as f:
+        expected = json.load(f)["leaderboard"]
+
+    with app.PERSIST_LOCK:
+        shutil.copyfile(baseline, app.DATA_FILE)
+        os.ftruncate(app.wal_fd(), 0)
+        restart(app)
+
+    assert set(app.LEADERBOARD) == set(expected)
+    for player_id, record in app.LEADERBOARD.items():
+        assert app.public_stats(record) == expected[player_id]
+
+    # Legacy records carry the derived fields the AI relies on
+    aric = app.LEADERBOARD["a60d43c8-3e84-405f-a2a3-9e433a95ace3"]
+    assert aric.total_choices == 10
+    assert aric.last_pattern == app.pattern_key("paper", "rock")